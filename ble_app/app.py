@@ -1,17 +1,16 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import asyncio
-import json
+import logging
 import time
-from datetime import datetime
 import numpy as np
 from collections import deque
 from bleak import BleakClient
 import threading
-import queue
+
+logger = logging.getLogger(__name__)
 
 # Configure Streamlit page
 st.set_page_config(
@@ -26,42 +25,151 @@ ARDUINO_ADDRESS = "64609202-37DA-83AF-1A6A-87D95E127B3F"
 SERVICE_UUID = "12345678-1234-1234-1234-123456789abc"
 CHARACTERISTIC_UUID = "87654321-4321-4321-4321-cba987654321"
 
+# Each BLE notification carries a batch of packed little-endian samples:
+# device millis, activity id, ax, ay, az, confidence. Activity ids index into
+# ACT_TABLE and must match the table in the .ino sketch.
+ACT_TABLE = ('Walking', 'Jogging', 'Sitting', 'Standing', 'Upstairs', 'Downstairs')
+_SAMPLE_DTYPE = np.dtype([('t', '<u4'), ('act', 'u1'), ('ax', '<f4'), ('ay', '<f4'), ('az', '<f4'), ('conf', '<f4')])
+
+# Samples per notification; must match SAMPLES_PER_PACKET in the .ino sketch
+SAMPLES_PER_PACKET = 8
+# Number of samples kept for display: the last 100 notifications (~100 s at one per second)
+DATA_WINDOW = 100 * SAMPLES_PER_PACKET
+# Maximum points drawn per accelerometer trace; longer windows are downsampled
+ACCEL_MAX_POINTS = 100
+# Approximate number of activity timeline markers; activity changes are always drawn
+TIMELINE_MAX_POINTS = 100
+
+# Consistent color mapping for all charts
+_ACTIVITY_COLORS = {
+    'Standing': '#1f77b4',
+    'Walking': '#ff7f0e',
+    'Jogging': '#d62728',
+    'Upstairs': '#2ca02c',
+    'Downstairs': '#9467bd',
+    'Sitting': '#8c564b'  # Changed to brown to avoid blue conflict
+}
+_ACTIVITY_ORDER = list(_ACTIVITY_COLORS)
+
+_ACTIVITY_EMOJI = {
+    'Walking': '🚶🏼‍♀️',
+    'Jogging': '🏃‍♀️',
+    'Sitting': '🧘',
+    'Standing': '🧍',
+    'Upstairs': '⬆️',
+    'Downstairs': '⬇️'
+}
+
+class RingBuffer:
+    """Fixed-size buffer of the latest samples, one NumPy array per field"""
+    def __init__(self, size=DATA_WINDOW):
+        self.size = size
+        self.t = np.zeros(size, dtype=np.int64)  # time.monotonic_ns() stamps
+        self.act_id = np.zeros(size, dtype=np.uint8)
+        self.ax = np.zeros(size, dtype=np.float32)
+        self.ay = np.zeros(size, dtype=np.float32)
+        self.az = np.zeros(size, dtype=np.float32)
+        self.conf = np.zeros(size, dtype=np.float32)
+        # Samples per activity id currently in the buffer, kept up to date by push()
+        self.counts = np.zeros(len(ACT_TABLE), dtype=np.int32)
+        self.i = 0
+        # push() runs on the BLE loop and clear() on the Streamlit thread
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return min(self.i, self.size)
+    
+    @property
+    def write_ctr(self):
+        """Total number of samples written since the last clear"""
+        return self.i
+    
+    def push(self, t, act_id, ax, ay, az, conf):
+        """Write one sample, or equal-length arrays of samples, at the cursor"""
+        n = np.size(act_id)
+        if n > self.size:
+            # Only the last `size` samples fit in the buffer
+            t, act_id, ax, ay, az, conf = (np.asarray(col)[-self.size:] for col in (t, act_id, ax, ay, az, conf))
+        with self._lock:
+            idx = np.arange(self.i + n - np.size(act_id), self.i + n) % self.size
+            # Slots below the write count already hold a sample, which leaves the window
+            np.subtract.at(self.counts, self.act_id[idx[idx < self.i]], 1)
+            np.add.at(self.counts, act_id, 1)
+            self.t[idx] = t
+            self.act_id[idx] = act_id
+            self.ax[idx] = ax
+            self.ay[idx] = ay
+            self.az[idx] = az
+            self.conf[idx] = conf
+            self.i += n
+    
+    def view(self, start, end):
+        """Return (t, act_id, ax, ay, az, conf) arrays for write counters [start, end)
+        
+        Samples that have already been overwritten are skipped.
+        """
+        idx = np.arange(max(start, end - self.size), end) % self.size
+        return tuple(col[idx] for col in (self.t, self.act_id, self.ax, self.ay, self.az, self.conf))
+    
+    def clear(self):
+        with self._lock:
+            self.counts[:] = 0
+            self.i = 0
+
 # Initialize session state
 if 'connected' not in st.session_state:
     st.session_state.connected = False
 if 'data_queue' not in st.session_state:
-    st.session_state.data_queue = deque(maxlen=100)
-if 'ble_thread' not in st.session_state:
-    st.session_state.ble_thread = None
-if 'stop_event' not in st.session_state:
-    st.session_state.stop_event = threading.Event()
+    st.session_state.data_queue = RingBuffer()
+if 'df' not in st.session_state:
+    st.session_state.df = None
+    st.session_state.seen_ctr = 0
+if 'ble_future' not in st.session_state:
+    # Future of the running connect_and_run() and the BLEManager running it
+    st.session_state.ble_future = None
+    st.session_state.ble_manager = None
 if 'message_queue' not in st.session_state:
-    st.session_state.message_queue = queue.Queue()
+    st.session_state.message_queue = deque()
 
 class BLEManager:
-    def __init__(self, data_queue, message_queue, stop_event):
+    def __init__(self, data_queue, message_queue):
         self.data_queue = data_queue
         self.message_queue = message_queue
-        self.stop_event = stop_event
+        self.stop_event = None  # Created on the BLE event loop by connect_and_run
         self.client = None
         self.connected = False
+        
+        # Bound once so data_handler doesn't re-resolve them per notification
+        self._data_push = data_queue.push
+        self._message_append = message_queue.append
     
     def data_handler(self, sender, data):
         """Handle incoming BLE data"""
-        print("data", data)
+        logger.debug("data %s", data)
         try:
-            json_data = json.loads(data.decode('utf-8'))
-            print(json_data)
-            json_data['received_time'] = time.time()
-            json_data['datetime'] = datetime.now()
-            self.data_queue.append(json_data)
+            arr = np.frombuffer(data, dtype=_SAMPLE_DTYPE)
+            arr = arr[arr['act'] < len(ACT_TABLE)]
+            if len(arr):
+                # Place each sample on the host clock relative to when the batch arrived
+                t = time.monotonic_ns() - (arr['t'][-1] - arr['t']).astype(np.int64) * 1_000_000
+                self._data_push(t, arr['act'], arr['ax'], arr['ay'], arr['az'], arr['conf'])
         except Exception as e:
-            self.message_queue.put(('error', f"Data processing error: {e}"))
+            self._message_append(('error', f"Data processing error: {e}"))
+    
+    def stop(self):
+        """Stop connect_and_run; call on the BLE event loop (call_soon_threadsafe)"""
+        if self.stop_event is not None:
+            self.stop_event.set()
     
     async def connect_and_run(self):
         """Connect to Arduino and handle data collection"""
+        self.stop_event = asyncio.Event()
         try:
-            self.client = BleakClient(ARDUINO_ADDRESS, timeout=15.0)
+            self.client = BleakClient(
+                ARDUINO_ADDRESS,
+                timeout=15.0,
+                disconnected_callback=lambda client: self.stop_event.set()
+            )
             await self.client.connect()
             
             # Verify service exists
@@ -71,17 +179,16 @@ class BLEManager:
             
             if not service_found:
                 await self.client.disconnect()
-                self.message_queue.put(('error', 'Arduino service not found'))
+                self.message_queue.append(('error', 'Arduino service not found'))
                 return
             
             # Start notifications
             await self.client.start_notify(CHARACTERISTIC_UUID, self.data_handler)
             self.connected = True
-            self.message_queue.put(('success', 'Connected successfully'))
+            self.message_queue.append(('success', 'Connected successfully'))
             
             # Keep connection alive until stop event
-            while not self.stop_event.is_set():
-                await asyncio.sleep(0.1)
+            await self.stop_event.wait()
             
             # Clean disconnect
             if self.client and self.client.is_connected:
@@ -89,39 +196,143 @@ class BLEManager:
                 await self.client.disconnect()
             
             self.connected = False
-            self.message_queue.put(('info', 'Disconnected'))
+            self.message_queue.append(('info', 'Disconnected'))
             
         except Exception as e:
             self.connected = False
-            self.message_queue.put(('error', f'Connection failed: {e}'))
+            self.message_queue.append(('error', f'Connection failed: {e}'))
 
-def ble_thread_function(data_queue, message_queue, stop_event):
-    """Thread function to run BLE operations"""
-    def run_ble():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        ble_manager = BLEManager(data_queue, message_queue, stop_event)
-        
-        try:
-            loop.run_until_complete(ble_manager.connect_and_run())
-        except Exception as e:
-            message_queue.put(('error', f'BLE thread error: {e}'))
-        finally:
-            loop.close()
+@st.cache_resource
+def get_ble_loop():
+    """Event loop shared by all BLE connections, running on a daemon thread
     
-    thread = threading.Thread(target=run_ble, daemon=True)
+    Cached as a resource so it is started once per process rather than on
+    every script rerun. Schedule coroutines on it with
+    asyncio.run_coroutine_threadsafe and callbacks with call_soon_threadsafe.
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
     thread.start()
-    return thread
+    return loop
+
+def to_datetime(t):
+    """Convert time.monotonic_ns() stamps to local wall-clock datetimes"""
+    origin = pd.Timestamp.now() - pd.Timedelta(time.monotonic_ns(), unit='ns')
+    return origin + pd.to_timedelta(t, unit='ns')
+
+def drain_samples():
+    """Append samples written since the last render to the cached DataFrame
+    
+    Returns the number of new samples, so callers can skip work when idle.
+    """
+    write_ctr = st.session_state.data_queue.write_ctr
+    if write_ctr == st.session_state.seen_ctr:
+        return 0
+    
+    t, act_id, ax, ay, az, conf = st.session_state.data_queue.view(st.session_state.seen_ctr, write_ctr)
+    st.session_state.seen_ctr = write_ctr
+    new_df = pd.DataFrame({
+        'datetime': to_datetime(t),
+        'act': np.asarray(ACT_TABLE)[act_id],
+        'confidence': conf,
+        'ax': ax,
+        'ay': ay,
+        'az': az,
+    })
+    if st.session_state.df is None:
+        st.session_state.df = new_df
+    else:
+        st.session_state.df = pd.concat([st.session_state.df, new_df], ignore_index=True).tail(DATA_WINDOW)
+    return len(new_df)
+
+def refresh_data():
+    """Drain new samples and push them into the persistent figures"""
+    if 'figures' not in st.session_state:
+        st.session_state.figures = create_figures()
+    # Only touch the figures when new samples arrived since the last render
+    if drain_samples():
+        update_figures(st.session_state.df)
+
+def update_figures(df):
+    """Push the current display window into the persistent figures"""
+    fig_timeline, fig_accel, fig_pie = st.session_state.figures
+    with fig_timeline.batch_update():
+        shown = df.iloc[timeline_indices(df['act'].to_numpy(), TIMELINE_MAX_POINTS)]
+        for trace in fig_timeline.data:
+            rows = shown[shown['act'] == trace.name]
+            trace.x, trace.y = rows['datetime'], rows['act']
+    with fig_accel.batch_update():
+        t = df['datetime'].to_numpy().astype(np.int64)
+        for trace, axis in zip(fig_accel.data, ['ax', 'ay', 'az']):
+            keep = lttb_indices(t, df[axis].to_numpy(), ACCEL_MAX_POINTS)
+            trace.x, trace.y = df['datetime'].iloc[keep], df[axis].iloc[keep]
+    fig_pie.data[0].values = st.session_state.data_queue.counts.copy()
+
+def timeline_indices(act, n_out):
+    """Indices of every k-th sample plus every activity change, keeping roughly n_out markers"""
+    keep = np.zeros(len(act), dtype=bool)
+    keep[::max(1, -(-len(act) // n_out))] = True
+    keep[1:] |= act[1:] != act[:-1]
+    return np.flatnonzero(keep)
+
+def lttb_indices(x, y, n_out):
+    """Indices of the points kept by largest-triangle-three-buckets downsampling"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    # First and last points are always kept; the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average point of the next bucket (the last point for the final bucket)
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        # Keep the point forming the largest triangle with the previous kept point and that average
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+def create_figures():
+    """Build the dashboard figures once; reruns only replace their data"""
+    # One marker trace per activity, in a fixed order
+    fig_timeline = go.Figure([
+        go.Scatter(x=[], y=[], mode='markers', name=act, marker=dict(color=_ACTIVITY_COLORS[act], size=10))
+        for act in _ACTIVITY_ORDER
+    ])
+    fig_timeline.update_layout(title="Activity Over Time", xaxis_title="datetime", yaxis_title="act", legend_title_text="act")
+    fig_timeline.update_yaxes(categoryorder='array', categoryarray=_ACTIVITY_ORDER)  # Force consistent ordering
+    
+    fig_accel = go.Figure()
+    fig_accel.add_trace(go.Scattergl(x=[], y=[], name='X', line=dict(color='red')))
+    fig_accel.add_trace(go.Scattergl(x=[], y=[], name='Y', line=dict(color='green')))
+    fig_accel.add_trace(go.Scattergl(x=[], y=[], name='Z', line=dict(color='blue')))
+    fig_accel.update_layout(title="Accelerometer Data (g)", yaxis_title="Acceleration (g)")
+    
+    # Ensure the pie chart uses the same colors; values are RingBuffer.counts, indexed like ACT_TABLE
+    fig_pie = go.Figure(go.Pie(
+        labels=ACT_TABLE,
+        values=[0] * len(ACT_TABLE),
+        marker=dict(colors=[_ACTIVITY_COLORS[act] for act in ACT_TABLE]),
+    ))
+    fig_pie.update_layout(title="Time Spent in Each Activity")
+    
+    return fig_timeline, fig_accel, fig_pie
 
 def check_messages():
     """Check for messages from BLE thread"""
     messages = []
+    message_queue = st.session_state.message_queue
     try:
-        while True:
-            msg_type, msg = st.session_state.message_queue.get_nowait()
-            messages.append((msg_type, msg))
-    except queue.Empty:
+        while message_queue:
+            messages.append(message_queue.popleft())
+    except IndexError:
         pass
     return messages
 
@@ -143,6 +354,9 @@ def main():
             if 'Disconnected' in msg:
                 st.session_state.connected = False
     
+    # Drain once up front so the sidebar stats and the charts start from the same window
+    refresh_data()
+    
     # Sidebar controls
     with st.sidebar:
         st.header("Arduino Connection")
@@ -154,23 +368,22 @@ def main():
         
         with col1:
             if st.button("Connect", disabled=st.session_state.connected):
-                if not st.session_state.ble_thread or not st.session_state.ble_thread.is_alive():
-                    st.session_state.stop_event.clear()
-                    st.session_state.ble_thread = ble_thread_function(
+                if not st.session_state.ble_future or st.session_state.ble_future.done():
+                    ble_manager = BLEManager(
                         st.session_state.data_queue,
-                        st.session_state.message_queue,
-                        st.session_state.stop_event
+                        st.session_state.message_queue
                     )
+                    st.session_state.ble_future = asyncio.run_coroutine_threadsafe(
+                        ble_manager.connect_and_run(), get_ble_loop()
+                    )
+                    st.session_state.ble_manager = ble_manager
                     st.info("Connecting to Arduino...")
-                    time.sleep(0.5)  # Give thread time to start
-                    st.rerun()
         
         with col2:
             if st.button("Disconnect", disabled=not st.session_state.connected):
-                st.session_state.stop_event.set()
+                get_ble_loop().call_soon_threadsafe(st.session_state.ble_manager.stop)
                 st.session_state.connected = False
                 st.info("Disconnecting...")
-                time.sleep(0.5)
                 st.rerun()
         
         # Connection status
@@ -183,102 +396,82 @@ def main():
         st.header("Data Controls")
         if st.button("Clear Data"):
             st.session_state.data_queue.clear()
+            st.session_state.df = None
+            st.session_state.seen_ctr = 0
             st.success("Data cleared")
         
         # Stats
-        if st.session_state.data_queue:
-            st.header("Session Stats")
-            st.metric("Data Points", len(st.session_state.data_queue))
-            
-            # Latest activity
-            latest = list(st.session_state.data_queue)[-1]
-            st.metric("Current Activity", latest.get('act', 'unknown').title())
+        render_session_stats()
     
     # Main content
+    render_charts()
+
+@st.fragment(run_every=1.0)
+def render_session_stats():
+    """Refresh the sidebar stats every second without rerunning the whole page"""
+    # Fragments rerun on their own timers, so drain here too rather than wait for the charts
+    refresh_data()
+    df = st.session_state.df
+    if df is not None:
+        st.header("Session Stats")
+        st.metric("Data Points", len(df))
+        
+        # Latest activity
+        st.metric("Current Activity", df['act'].iat[-1].title())
+
+@st.fragment(run_every=1.0)
+def render_charts():
+    """Refresh the main content every second without rerunning the whole page"""
+    # Messages from the BLE thread can change the connection state, which the
+    # sidebar controls depend on, so let main() handle them in a full rerun
+    if st.session_state.message_queue:
+        st.rerun()
+    
     if st.session_state.connected and st.session_state.data_queue:
         display_real_time_data()
     elif st.session_state.connected:
         st.info("Connected! Waiting for data from Arduino...")
-        # Auto-refresh while waiting for data
-        time.sleep(1)
-        st.rerun()
     else:
         st.info("Please connect to your Arduino to start monitoring activities.")
 
 def display_real_time_data():
     """Display real-time data from Arduino"""
-    data_list = list(st.session_state.data_queue)
-    latest_data = data_list[-1]
-    print(latest_data)
+    refresh_data()
+    df = st.session_state.df
+    latest_data = df.iloc[-1]
+    logger.debug("latest %s", latest_data)
+    activity = latest_data['act']
     
     # Current activity display - full width
-    activity_emoji = {
-        'Walking': '🚶🏼‍♀️',
-        'Jogging': '🏃‍♀️', 
-        'Sitting': '🧘',
-        'Standing': '🧍',
-        'Upstairs': '⬆️',
-        'Downstairs': '⬇️'
-    }
-    
-    activity = latest_data.get('act', 'unknown')
     st.metric(
         label="Current Activity",
-        value=f"{activity_emoji.get(activity, '❓')} {activity.title()}"
+        value=f"{_ACTIVITY_EMOJI.get(activity, '❓')} {activity.title()}"
     )
     
     # Second row: Model confidence + Accelerometer data
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        if 'confidence' in latest_data:
-            st.metric("Model Confidence", f"{latest_data.get('confidence', 0):.1%}")
-        else:
-            st.metric("Model Confidence", "N/A")
+        st.metric("Model Confidence", f"{latest_data['confidence']:.1%}")
     
     with col2:
-        st.metric("Accel X", f"{latest_data.get('ax', 0):.3f} g")
+        st.metric("Accel X", f"{latest_data['ax']:.3f} g")
     
     with col3:
-        st.metric("Accel Y", f"{latest_data.get('ay', 0):.3f} g")
+        st.metric("Accel Y", f"{latest_data['ay']:.3f} g")
     
     with col4:
-        st.metric("Accel Z", f"{latest_data.get('az', 0):.3f} g")
+        st.metric("Accel Z", f"{latest_data['az']:.3f} g")
     
-    if len(data_list) > 1:
-        # Convert to DataFrame
-        df = pd.DataFrame(data_list)
-        df['datetime'] = pd.to_datetime([d['datetime'] for d in data_list])
+    if len(df) > 1:
+        fig_timeline, fig_accel, fig_pie = st.session_state.figures
         
         # Activity timeline
         st.subheader("📈 Activity Timeline")
-        
-        # Consistent color mapping for all charts
-        activity_colors = {
-            'Standing': '#1f77b4',
-            'Walking': '#ff7f0e', 
-            'Jogging': '#d62728',
-            'Upstairs': '#2ca02c',
-            'Downstairs': '#9467bd',
-            'Sitting': '#8c564b'  # Changed to brown to avoid blue conflict
-        }
-        
-        fig_timeline = px.scatter(
-            df, x='datetime', y='act', color='act',
-            title="Activity Over Time",
-            color_discrete_map=activity_colors,
-            category_orders={'act': list(activity_colors.keys())}  # Force consistent ordering
-        )
-        fig_timeline.update_traces(marker_size=10)
         st.plotly_chart(fig_timeline, use_container_width=True)
         
         # Accelerometer data chart (no tabs needed)
         st.subheader("📊 Accelerometer Data")
-        fig_accel = go.Figure()
-        fig_accel.add_trace(go.Scatter(x=df['datetime'], y=df['ax'], name='X', line=dict(color='red')))
-        fig_accel.add_trace(go.Scatter(x=df['datetime'], y=df['ay'], name='Y', line=dict(color='green')))
-        fig_accel.add_trace(go.Scatter(x=df['datetime'], y=df['az'], name='Z', line=dict(color='blue')))
-        fig_accel.update_layout(title="Accelerometer Data (g)", yaxis_title="Acceleration (g)")
         st.plotly_chart(fig_accel, use_container_width=True)
         
         # Activity analysis
@@ -286,29 +479,14 @@ def display_real_time_data():
         
         with col1:
             st.subheader("Activity Distribution")
-            activity_counts = df['act'].value_counts()
-            
-            # Ensure the pie chart uses the same order and colors
-            fig_pie = px.pie(
-                values=activity_counts.values,
-                names=activity_counts.index,
-                title="Time Spent in Each Activity",
-                color_discrete_map=activity_colors,
-            )
             st.plotly_chart(fig_pie, use_container_width=True)
         
         with col2:
             st.subheader("📋 Recent Data")
-            display_df = df.tail(10)[['datetime', 'act', 'ax', 'ay', 'az']].copy()
-            if 'confidence' in df.columns:
-                display_df = df.tail(10)[['datetime', 'act', 'confidence', 'ax', 'ay', 'az']].copy()
+            display_df = df.tail(10).copy()
             display_df['datetime'] = display_df['datetime'].dt.strftime('%H:%M:%S')
             display_df = display_df.round(3)
             st.dataframe(display_df, use_container_width=True, hide_index=True)
-    
-    # Auto-refresh every 1 second
-    time.sleep(1)
-    st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
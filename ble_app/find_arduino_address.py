@@ -3,10 +3,41 @@
 Enhanced Arduino Nano 33 BLE Sense scanner with multiple methods
 """
 
+import argparse
 import asyncio
+import os
 import platform
 from bleak import BleakScanner, BleakClient
 
+# Must match the UUIDs in the .ino sketch (bleak reports UUIDs in lowercase)
+SERVICE_UUID = "12345678-1234-1234-1234-123456789abc"
+CHARACTERISTIC_UUID = "87654321-4321-4321-4321-cba987654321"
+
+# Address of the last Arduino found, checked first on the next run
+ADDRESS_CACHE = os.path.expanduser("~/.har_wisdm_device")
+
+def load_cached_address():
+    """Return the address saved by a previous run, if any"""
+    try:
+        with open(ADDRESS_CACHE) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def save_cached_address(address):
+    """Remember the Arduino address for the next run"""
+    try:
+        with open(ADDRESS_CACHE, "w") as f:
+            f.write(address + "\n")
+    except OSError as e:
+        print(f"Could not save address to {ADDRESS_CACHE}: {e}")
+
+async def scan_known_address(address):
+    """Look for a known address, stopping as soon as it advertises"""
+    print(f"Looking for known device {address}...")
+    device = await BleakScanner.find_device_by_address(address, timeout=3.0)
+    return [device] if device else []
+
 async def scan_method_1():
     """Standard BLE scan"""
     print("Method 1: Standard BLE scan...")
@@ -32,11 +63,9 @@ async def scan_method_2():
 async def scan_method_3():
     """Scan for specific service UUID"""
     print("Method 3: Scanning for Arduino service UUID...")
-    arduino_service_uuid = "12345678-1234-1234-1234-123456789abc"
-    
     devices = await BleakScanner.discover(
         timeout=15.0,
-        service_uuids=[arduino_service_uuid]
+        service_uuids=[SERVICE_UUID]
     )
     return devices
 
@@ -47,7 +76,7 @@ async def detailed_device_check(device):
         print(f"   Address: {device.address}")
         
         async with BleakClient(device.address, timeout=10.0) as client:
-            if await client.is_connected():
+            if client.is_connected:
                 print("   ✓ Successfully connected")
                 
                 services = client.services
@@ -57,14 +86,14 @@ async def detailed_device_check(device):
                 for service in services:
                     print(f"     Service: {service.uuid}")
                     
-                    if "12345678-1234-1234-1234-123456789abc" in str(service.uuid):
+                    if service.uuid.lower() == SERVICE_UUID:
                         print("     ⭐⭐⭐ ARDUINO SERVICE FOUND! ⭐⭐⭐")
                         arduino_service_found = True
                         
                         # Check characteristics
                         for char in service.characteristics:
                             print(f"       Characteristic: {char.uuid}")
-                            if "87654321-4321-4321-4321-cba987654321" in str(char.uuid):
+                            if char.uuid.lower() == CHARACTERISTIC_UUID:
                                 print("       ⭐ Arduino activity characteristic found!")
                 
                 if arduino_service_found:
@@ -80,7 +109,7 @@ async def detailed_device_check(device):
     
     return False
 
-async def main():
+async def main(address=None):
     print("=" * 60)
     print("Arduino Nano 33 BLE Sense Scanner")
     print("=" * 60)
@@ -89,6 +118,21 @@ async def main():
     
     all_devices = []
     
+    # Try a known address first and only fall back to a full scan if it's not found
+    known_address = address or load_cached_address()
+    if known_address:
+        print("-" * 50)
+        known_devices = await scan_known_address(known_address)
+        if known_devices:
+            print(f"Found known device: {known_devices[0].name or 'Unknown'} - {known_address}")
+            if await detailed_device_check(known_devices[0]):
+                save_cached_address(known_devices[0].address)
+                return
+            print("Known device failed the detailed check, falling back to a full scan")
+        else:
+            print("Known device not found, falling back to a full scan")
+        print()
+    
     # Try multiple scanning methods
     # for scan_method in [scan_method_1, scan_method_2, scan_method_3]:
     for scan_method in [scan_method_1]:
@@ -135,25 +179,46 @@ async def main():
         print("5. Try running with sudo: sudo python find_arduino_address.py")
         return
     
-    # Check each device in detail
-    arduino_found = False
+    # Pick candidates by known address or name
+    candidates = []
     for device in unique_devices:
         name = device.name or "Unknown"
         
-        # name check first
-        if any(keyword in name.lower() for keyword in ['arduino', 'activity', 'blesense']):
-            print(f"⭐ Potential Arduino by name: {name} - {device.address}")
-            if await detailed_device_check(device):
-                arduino_found = True
-                break
+        if device.address.lower() == (known_address or "").lower() or any(keyword in name.lower() for keyword in ['arduino', 'activity', 'blesense']):
+            print(f"⭐ Potential Arduino: {name} - {device.address}")
+            candidates.append(device)
         
         # Check unknown devices
         # elif name == "Unknown" or name is None:
         #     print(f"🤔 Checking unknown device: {device.address}")
-        #     if await detailed_device_check(device):
-        #         arduino_found = True
-        #         break
+        #     candidates.append(device)
+    
+    async def check(device):
+        return device if await detailed_device_check(device) else None
+    
+    # Check all candidates in detail concurrently and stop at the first Arduino
+    tasks = [asyncio.create_task(check(device)) for device in candidates]
+    arduino = None
+    try:
+        for result in asyncio.as_completed(tasks):
+            arduino = await result
+            if arduino:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Let cancelled checks disconnect cleanly
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    if arduino:
+        save_cached_address(arduino.address)
+    else:
+        print(f"\n❌ None of the {len(candidates)} candidate devices is the Arduino")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--address", help="known Arduino address to look up before doing a full scan "
+                                          f"(defaults to the one saved in {ADDRESS_CACHE})")
+    args = parser.parse_args()
+    asyncio.run(main(args.address))
\ No newline at end of file
@@ -19,18 +19,40 @@
 // #define WISDM_INTERVAL_MS 50  // 20 Hz like WISDM paper
 // #endif
 
+/* Binary sample sent over BLE - must match ACT_TABLE / _SAMPLE_DTYPE in app.py */
+typedef struct __attribute__((packed)) {
+    uint32_t t;         // millis() when the sample was taken
+    uint8_t act;        // Index into ACTIVITY_TABLE
+    float ax;           // Accelerometer X (g)
+    float ay;           // Accelerometer Y (g)
+    float az;           // Accelerometer Z (g)
+    float confidence;   // Model confidence
+} activity_sample_t;
+
+/* Samples are batched so each notification carries several of them (8 x 21 bytes
+ * stays within the ATT payload negotiated by common desktop BLE stacks) */
+#define SAMPLES_PER_PACKET  8   // Mirrored as SAMPLES_PER_PACKET in app.py
+
+static const char *ACTIVITY_TABLE[] = { "Walking", "Jogging", "Sitting", "Standing", "Upstairs", "Downstairs" };
+static const uint8_t ACTIVITY_COUNT = sizeof(ACTIVITY_TABLE) / sizeof(ACTIVITY_TABLE[0]);
+static const uint8_t ACTIVITY_UNKNOWN = 0xFF;
+
 /* BLE Service and Characteristic UUIDs */
 BLEService activityService("12345678-1234-1234-1234-123456789abc");
-BLEStringCharacteristic activityCharacteristic("87654321-4321-4321-4321-cba987654321", BLERead | BLENotify, 200);
+BLECharacteristic activityCharacteristic("87654321-4321-4321-4321-cba987654321", BLERead | BLENotify, sizeof(activity_sample_t) * SAMPLES_PER_PACKET);
 
 /* Private variables ------------------------------------------------------- */
 static bool debug_nn = false; // Set this to true to see e.g. features generated from the raw signal
 
 // Timing variables
 unsigned long lastInference = 0;
-unsigned long lastDataSend = 0;
+unsigned long lastSample = 0;
 const unsigned long INFERENCE_INTERVAL = 2000; // Run inference every 2 seconds
-const unsigned long DATA_SEND_INTERVAL = 1000; // Send data every 1 second
+const unsigned long SAMPLE_INTERVAL = 125;     // Sample every 125 ms, i.e. one full packet per second
+
+// Samples waiting to be sent
+activity_sample_t sampleBatch[SAMPLES_PER_PACKET];
+size_t sampleCount = 0;
 
 // Current results - simplified
 String currentActivity = "unknown";
@@ -77,7 +99,8 @@ void setup()
     Serial.println("✓ Service added");
 
     // Set initial value
-    activityCharacteristic.writeValue("{}");
+    activity_sample_t emptySample = { 0, ACTIVITY_UNKNOWN, 0.0f, 0.0f, 0.0f, 0.0f };
+    activityCharacteristic.writeValue((uint8_t *)&emptySample, sizeof(emptySample));
     Serial.println("✓ Initial characteristic value set");
 
     // Start advertising
@@ -121,15 +144,28 @@ void loop()
                 lastInference = millis();
             }
             
-            // Send data via BLE periodically
-            if (millis() - lastDataSend >= DATA_SEND_INTERVAL && hasValidResult) {
-                String jsonData = createJsonData();
-                activityCharacteristic.writeValue(jsonData);
-                Serial.println("Sent: " + jsonData);
-                lastDataSend = millis();
+            // Sample periodically and send via BLE once a batch is full
+            if (millis() - lastSample >= SAMPLE_INTERVAL && hasValidResult) {
+                sampleBatch[sampleCount++] = createSample();
+                lastSample = millis();
+                
+                if (sampleCount == SAMPLES_PER_PACKET) {
+                    activityCharacteristic.writeValue((uint8_t *)sampleBatch, sizeof(sampleBatch));
+                    Serial.print("Sent ");
+                    Serial.print(sampleCount);
+                    Serial.print(" samples: ");
+                    Serial.print(currentActivity);
+                    Serial.print(" (");
+                    Serial.print(currentConfidence, 3);
+                    Serial.println(")");
+                    sampleCount = 0;
+                }
             }
         }
         
+        // Drop any partial batch from this connection
+        sampleCount = 0;
+        
         Serial.print("Disconnected from central: ");
         Serial.println(central.address());
     } else {
@@ -272,35 +308,37 @@ void runInference() {
 }
 
 /**
- * @brief Create JSON data for BLE transmission - matches Python app format
+ * @brief Map an Edge Impulse label to its index in ACTIVITY_TABLE
  */
-String createJsonData() {
+uint8_t activityId(const String &activity) {
+    for (uint8_t ix = 0; ix < ACTIVITY_COUNT; ix++) {
+        if (activity == ACTIVITY_TABLE[ix]) {
+            return ix;
+        }
+    }
+    return ACTIVITY_UNKNOWN;
+}
+
+/**
+ * @brief Create binary sample for BLE transmission - matches Python app format
+ */
+activity_sample_t createSample() {
     // Get current sensor readings for real-time display
-    float accelX, accelY, accelZ;
-    float gyroX, gyroY, gyroZ;
+    float accelX = 0.0f, accelY = 0.0f, accelZ = 0.0f;
     
     if (IMU.accelerationAvailable()) {
         IMU.readAcceleration(accelX, accelY, accelZ);
     }
     
-    if (IMU.gyroscopeAvailable()) {
-        IMU.readGyroscope(gyroX, gyroY, gyroZ);
-    }
-    
-    // Create JSON in the format expected by Python app
-    String json = "{";
-    json += "\"act\":\"" + currentActivity + "\",";          // Keep original case from Edge Impulse
-    json += "\"confidence\":" + String(currentConfidence, 3) + ",";
-    json += "\"ax\":" + String(accelX, 3) + ",";             // Accelerometer X
-    json += "\"ay\":" + String(accelY, 3) + ",";             // Accelerometer Y  
-    json += "\"az\":" + String(accelZ, 3) + ",";             // Accelerometer Z
-    json += "\"gx\":" + String(gyroX, 1) + ",";              // Gyroscope X
-    json += "\"gy\":" + String(gyroY, 1) + ",";              // Gyroscope Y
-    json += "\"gz\":" + String(gyroZ, 1) + ",";              // Gyroscope Z
-    json += "\"t\":" + String(millis());                     // Timestamp
-    json += "}";
+    activity_sample_t sample;
+    sample.t = millis();
+    sample.act = activityId(currentActivity);  // Index into ACTIVITY_TABLE
+    sample.ax = accelX;
+    sample.ay = accelY;
+    sample.az = accelZ;
+    sample.confidence = currentConfidence;
     
-    return json;
+    return sample;
 }
 
 #if !defined(EI_CLASSIFIER_SENSOR) || EI_CLASSIFIER_SENSOR != EI_CLASSIFIER_SENSOR_ACCELEROMETER